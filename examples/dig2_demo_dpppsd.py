@@ -7,11 +7,15 @@ __copyright__ = 'Copyright (C) 2023 CAEN SpA'
 __license__ = 'MIT-0'  # SPDX-License-Identifier
 __contact__ = 'https://www.caen.it/'
 
+from fractions import Fraction
+import threading
+import time
+
 import matplotlib.pyplot as plt
 import numpy as np
 
 # To install the module: pip install caen-felib
-from caen_felib import lib, device, error
+from caen_felib import lib, device, dsp, error, schemas
 
 print(f'CAEN FELib wrapper loaded (lib version {lib.version})')
 
@@ -32,10 +36,10 @@ with device.connect(dig2_uri) as dig:
     dig.cmd.RESET()
 
     # Get board info
-    adc_samplrate_msps = float(dig.par.ADC_SAMPLRATE.value)  # in Msps
+    n_ch = int(dig.par.NUMCH.value)
+    adc_samplrate_msps = Fraction(dig.par.ADC_SAMPLRATE.value)  # in Msps
     adc_n_bits = int(dig.par.ADC_NBIT.value)
-    sampling_period_ns = int(1e3 / adc_samplrate_msps)
-    fw_type = dig.par.FWTYPE.value
+    sampling_period_ns = 1000 / adc_samplrate_msps  # exact, also if not integer
 
     # Configuration parameters
     reclen_ns = 4096  # in ns
@@ -43,116 +47,137 @@ with device.connect(dig2_uri) as dig:
 
     # Configure digitizer
     dig.par.GLOBALTRIGGERSOURCE.value = 'SWTRG'  # Enable software triggers
-    for i, ch in enumerate(dig.ch):
-        ch.par.CHENABLE.value = 'TRUE' if i == 0 else 'FALSE'  # Enable only channel 0
-        ch.par.EVENTTRIGGERSOURCE.value = 'GLOBALTRIGGERSOURCE'
-        ch.par.WAVETRIGGERSOURCE.value = 'GLOBALTRIGGERSOURCE'
-        ch.par.CHRECORDLENGTHT.value = f'{reclen_ns}'
-        ch.par.CHPRETRIGGERT.value = f'{pretrg_ns}'
-        ch.par.WAVEANALOGPROBE0.value = 'ADCINPUT'
-        ch.par.WAVEDIGITALPROBE0.value = 'TRIGGER'
+    all_ch = f'/ch/0..{n_ch - 1}'  # Channel range, to set a parameter on all channels with a single call
+    dig.set_value(f'{all_ch}/par/CHENABLE', 'FALSE')
+    dig.set_value(f'{all_ch}/par/EVENTTRIGGERSOURCE', 'GLOBALTRIGGERSOURCE')
+    dig.set_value(f'{all_ch}/par/WAVETRIGGERSOURCE', 'GLOBALTRIGGERSOURCE')
+    dig.set_value(f'{all_ch}/par/CHRECORDLENGTHT', f'{reclen_ns}')
+    dig.set_value(f'{all_ch}/par/CHPRETRIGGERT', f'{pretrg_ns}')
+    dig.set_value(f'{all_ch}/par/WAVEANALOGPROBE0', 'ADCINPUT')
+    dig.set_value(f'{all_ch}/par/WAVEDIGITALPROBE0', 'TRIGGER')
+    dig.ch[0].par.CHENABLE.value = 'TRUE'  # Enable only channel 0
 
     # Compute record length in samples
     reclen_ns = int(dig.ch[0].par.CHRECORDLENGTHT.value)  # Read back CHRECORDLENGTHT to check if there have been rounding
-    reclen = int(reclen_ns / sampling_period_ns)
+    reclen = reclen_ns // sampling_period_ns
+
+    # Preallocate x-axis values, sliced to the valid size on each event
+    sample_range = np.arange(reclen, dtype=np.uint64)
+
+    # Preallocate buffer used to scale the digital probe
+    digital_probe_1_scaled = np.empty(reclen, dtype=np.uint16)
 
     # Configure endpoint
-    data_format = [
-        {
-            'name': 'CHANNEL',
-            'type': 'U8',
-            'dim' : 0,
-        },
-        {
-            'name': 'TIMESTAMP',
-            'type': 'U64',
-            'dim': 0,
-        },
-        {
-            'name': 'ENERGY',
-            'type': 'U16',
-            'dim': 0,
-        },
-        {
-            'name': 'ANALOG_PROBE_1',
-            'type': 'I16',
-            'dim': 1,
-            'shape': [reclen],
-        },
-        {
-            'name': 'ANALOG_PROBE_1_TYPE',
-            'type': 'I32',
-            'dim': 0,
-        },
-        {
-            'name': 'DIGITAL_PROBE_1',
-            'type': 'U8',
-            'dim': 1,
-            'shape': [reclen],
-        },
-        {
-            'name': 'DIGITAL_PROBE_1_TYPE',
-            'type': 'I32',
-            'dim': 0,
-        },
-        {
-            'name': 'WAVEFORM_SIZE',
-            'type': 'SIZE_T',
-            'dim': 0,
-        },
-    ]
+    data_format = schemas.dpp_data_format(reclen)
     decoded_endpoint_path = 'dpppsd'
     endpoint = dig.endpoint[decoded_endpoint_path]
-    data = endpoint.set_read_data_format(data_format)
+    buffers = [endpoint.set_read_data_format(data_format), device.allocate_data(data_format)]  # Double buffering: [front, back]
+    buffers_lock = threading.Lock()
+    new_event = threading.Event()
+    acquisition_errors: list[BaseException] = []  # Raised on the acquisition thread, re-raised by the main thread
     dig.endpoint.par.ACTIVEENDPOINT.value = decoded_endpoint_path
 
-    # Get reference to data fields
-    channel = data[0].value
-    timestamp = data[1].value
-    energy = data[2].value
-    analog_probe_1 = data[3].value
-    analog_probe_1_type = data[4].value  # Integer value described in Supported Endpoints > Probe type meaning
-    digital_probe_1 = data[5].value
-    digital_probe_1_type = data[6].value  # Integer value described in Supported Endpoints > Probe type meaning
-    waveform_size = data[7].value
-
     # Configure plot
-    plt.ion()
     figure, ax = plt.subplots(figsize=(10, 8))
-    lines: list[plt.Line2D] = []
-    for i in range(2):
-        line, = ax.plot([], [], drawstyle='steps-post')
-        lines.append(line)
+    # Artists updated on each event are animated, to be excluded from the cached background
+    lines: list[plt.Line2D] = [ax.plot([], [], drawstyle='steps-post', animated=True)[0] for _ in range(2)]
     ax.set_xlim(0, reclen - 1)
     ax.set_ylim(0, 2 ** adc_n_bits - 1)
+    title = ax.set_title(' ', animated=True)
+
+    background = None  # Cached on each draw_event, before any blitting
+
+    def draw_animated_artists() -> None:
+        """Draw the animated artists over the canvas, without updating the screen"""
+        for line in lines:
+            ax.draw_artist(line)
+        ax.draw_artist(title)
+
+    def on_draw(_) -> None:
+        """Cache the background for blitting on each full redraw, like after a resize"""
+        global background  # pylint: disable=global-statement
+        background = figure.canvas.copy_from_bbox(figure.bbox)
+        draw_animated_artists()
+
+    # Render the static artists, caching the background on draw_event
+    figure.canvas.mpl_connect('draw_event', on_draw)
+    plt.show(block=False)
+    plt.pause(0.1)
+
+    def acquisition() -> None:
+        """Read some events into the back buffer, then swap it with the front buffer"""
+        try:
+            # Resolve nodes and methods once, out of the loop
+            send_sw_trigger = dig.cmd.SENDSWTRIGGER
+            try_read_data = endpoint.try_read_data
+            for _ in range(1000):
+                # Send software trigger
+                send_sw_trigger()
+
+                status = try_read_data(100, buffers[1])
+                if status is error.ErrorCode.TIMEOUT:
+                    continue
+                if status is error.ErrorCode.STOP:
+                    break
+
+                with buffers_lock:
+                    buffers.reverse()
+                new_event.set()
+        except BaseException as ex:  # pylint: disable=broad-exception-caught
+            acquisition_errors.append(ex)
 
     # Start acquisition
     dig.cmd.ARMACQUISITION()
     dig.cmd.SWSTARTACQUISITION()
 
-    # Read some events
-    for _ in range(1000):
-        # Send software trigger
-        dig.cmd.SENDSWTRIGGER()
-
-        try:
-            endpoint.read_data(100, data)
-        except error.Error as ex:
-            if ex.code is error.ErrorCode.TIMEOUT:
-                continue
-            if ex.code is error.ErrorCode.STOP:
-                break
-            raise ex
-
-        assert analog_probe_1_type == 0  # 0 -> 'adc_input'
-        assert digital_probe_1_type == 0  # 0 -> 'trigger'
-        valid_sample_range = np.arange(0, waveform_size, dtype=waveform_size.dtype)
-        lines[0].set_data(valid_sample_range, analog_probe_1)
-        lines[1].set_data(valid_sample_range, digital_probe_1.astype(np.uint16) * 2000 + 1000)  # scale digital probe to be visible
-
-        ax.title.set_text(f'Channel: {channel} Timestamp: {timestamp} Energy: {energy}')
-
-        figure.canvas.draw()
-        figure.canvas.flush_events()
+    # Read events on a separate thread, so that plotting does not delay the acquisition
+    acquisition_thread = threading.Thread(target=acquisition)
+    acquisition_thread.start()
+
+    # Plot the latest event, if any, until the end of the acquisition
+    canvas = figure.canvas
+    bbox = figure.bbox
+    refresh_period_s = 1 / 30  # Maximum refresh rate of 30 Hz, regardless of the trigger rate
+    next_refresh = time.monotonic()
+    while acquisition_thread.is_alive():
+        time.sleep(max(0., next_refresh - time.monotonic()))
+        if not new_event.wait(0.01):
+            canvas.flush_events()
+            continue
+        new_event.clear()
+        next_refresh = time.monotonic() + refresh_period_s
+
+        with buffers_lock:
+            # Get reference to data fields
+            data = buffers[0]
+            channel = data[0].value
+            timestamp = data[1].value
+            energy = data[2].value
+            analog_probe_1 = data[3].value
+            analog_probe_1_type = data[4].value  # Integer value described in Supported Endpoints > Probe type meaning
+            digital_probe_1 = data[5].value
+            digital_probe_1_type = data[6].value  # Integer value described in Supported Endpoints > Probe type meaning
+            waveform_size = data[7].value
+
+            assert analog_probe_1_type == 0  # 0 -> 'adc_input'
+            assert digital_probe_1_type == 0  # 0 -> 'trigger'
+            valid_size = int(waveform_size)
+            valid_sample_range = sample_range[:valid_size]
+            lines[0].set_data(valid_sample_range, analog_probe_1[:valid_size])
+            valid_digital_probe_1_scaled = digital_probe_1_scaled[:valid_size]
+            dsp.scale_offset(digital_probe_1[:valid_size], 2000, 1000, valid_digital_probe_1_scaled)  # scale digital probe to be visible
+            lines[1].set_data(valid_sample_range, valid_digital_probe_1_scaled)
+
+            title.set_text(f'Channel: {channel} Timestamp: {timestamp} Energy: {energy}')
+
+        # Redraw only the artists that changed
+        canvas.restore_region(background)
+        draw_animated_artists()
+        canvas.blit(bbox)
+        canvas.flush_events()
+
+    acquisition_thread.join()
+    if acquisition_errors:
+        raise acquisition_errors[0]
 
     dig.cmd.DISARMACQUISITION()
@@ -7,11 +7,15 @@ __copyright__ = 'Copyright (C) 2024 CAEN SpA'
 __license__ = 'MIT-0'  # SPDX-License-Identifier
 __contact__ = 'https://www.caen.it/'
 
+from fractions import Fraction
+import threading
+import time
+
 import matplotlib.pyplot as plt
 import numpy as np
 
 # To install the module: pip install caen-felib
-from caen_felib import lib, device, error
+from caen_felib import lib, device, error, schemas
 
 print(f'CAEN FELib wrapper loaded (lib version {lib.version})')
 
@@ -33,10 +37,9 @@ with device.connect(dig2_uri) as dig:
 
     # Get board info
     n_ch = int(dig.par.NUMCH.value)
-    adc_samplrate_msps = float(dig.par.ADC_SAMPLRATE.value)  # in Msps
+    adc_samplrate_msps = Fraction(dig.par.ADC_SAMPLRATE.value)  # in Msps
     adc_n_bits = int(dig.par.ADC_NBIT.value)
-    sampling_period_ns = int(1e3 / adc_samplrate_msps)
-    fw_type = dig.par.FWTYPE.value
+    sampling_period_ns = 1000 / adc_samplrate_msps  # exact, also if not integer
 
     # Configuration parameters
     reclen_ns = 4096  # in ns
@@ -51,76 +54,112 @@ with device.connect(dig2_uri) as dig:
     reclen_ns = int(dig.par.RECORDLENGTHT.value)  # Read back RECORDLENGTHS to check if there have been rounding
     reclen = reclen_ns // sampling_period_ns
 
+    # Preallocate x-axis values, sliced to the valid size on each event
+    sample_range = np.arange(reclen, dtype=np.uint64)
+
     # Configure endpoint
-    data_format = [
-        {
-            'name': 'EVENT_SIZE',
-            'type': 'SIZE_T',
-        },
-        {
-            'name': 'TIMESTAMP',
-            'type': 'U64',
-        },
-        {
-            'name': 'WAVEFORM',
-            'type': 'U16',
-            'dim': 2,
-            'shape': [n_ch, reclen],
-        },
-        {
-            'name': 'WAVEFORM_SIZE',
-            'type': 'U64',
-            'dim': 1,
-            'shape': [n_ch],
-        },
-    ]
+    data_format = schemas.scope_data_format(n_ch, reclen)
     decoded_endpoint_path = 'scope'
     endpoint = dig.endpoint[decoded_endpoint_path]
-    data = endpoint.set_read_data_format(data_format)
+    buffers = [endpoint.set_read_data_format(data_format), device.allocate_data(data_format)]  # Double buffering: [front, back]
+    buffers_lock = threading.Lock()
+    new_event = threading.Event()
+    acquisition_errors: list[BaseException] = []  # Raised on the acquisition thread, re-raised by the main thread
     dig.endpoint.par.ACTIVEENDPOINT.value = decoded_endpoint_path
 
-    # Get reference to data fields
-    event_size = data[0].value
-    timestamp = data[1].value
-    waveform = data[2].value
-    waveform_size = data[3].value
-
     # Configure plot
-    plt.ion()
     figure, ax = plt.subplots(figsize=(10, 8))
-    lines: list[plt.Line2D] = []
-    for i in range(n_ch):
-        line, = ax.plot([], [], drawstyle='steps-post')
-        lines.append(line)
+    # Artists updated on each event are animated, to be excluded from the cached background
+    lines: list[plt.Line2D] = [ax.plot([], [], drawstyle='steps-post', animated=True)[0] for _ in range(n_ch)]
     ax.set_xlim(0, reclen - 1)
     ax.set_ylim(0, 2 ** adc_n_bits - 1)
+    title = ax.set_title(' ', animated=True)
+
+    background = None  # Cached on each draw_event, before any blitting
+
+    def draw_animated_artists() -> None:
+        """Draw the animated artists over the canvas, without updating the screen"""
+        for line in lines:
+            ax.draw_artist(line)
+        ax.draw_artist(title)
+
+    def on_draw(_) -> None:
+        """Cache the background for blitting on each full redraw, like after a resize"""
+        global background  # pylint: disable=global-statement
+        background = figure.canvas.copy_from_bbox(figure.bbox)
+        draw_animated_artists()
+
+    # Render the static artists, caching the background on draw_event
+    figure.canvas.mpl_connect('draw_event', on_draw)
+    plt.show(block=False)
+    plt.pause(0.1)
+
+    def acquisition() -> None:
+        """Read some events into the back buffer, then swap it with the front buffer"""
+        try:
+            # Resolve nodes and methods once, out of the loop
+            send_sw_trigger = dig.cmd.SENDSWTRIGGER
+            try_read_data = endpoint.try_read_data
+            for _ in range(1000):
+                # Send software trigger
+                send_sw_trigger()
+
+                status = try_read_data(100, buffers[1])
+                if status is error.ErrorCode.TIMEOUT:
+                    continue
+                if status is error.ErrorCode.STOP:
+                    break
+
+                with buffers_lock:
+                    buffers.reverse()
+                new_event.set()
+        except BaseException as ex:  # pylint: disable=broad-exception-caught
+            acquisition_errors.append(ex)
 
     # Start acquisition
     dig.cmd.ARMACQUISITION()
     dig.cmd.SWSTARTACQUISITION()
 
-    # Read some events
-    for _ in range(1000):
-        # Send software trigger
-        dig.cmd.SENDSWTRIGGER()
-
-        try:
-            endpoint.read_data(100, data)
-        except error.Error as ex:
-            if ex.code is error.ErrorCode.TIMEOUT:
-                continue
-            if ex.code is error.ErrorCode.STOP:
-                break
-            raise ex
-
-        # Plot first 4 channels
-        for i in range(n_ch):
-            valid_sample_range = np.arange(0, waveform_size[i], dtype=waveform_size[i].dtype)
-            lines[i].set_data(valid_sample_range, waveform[i])
-
-        ax.title.set_text(f'Timestamp: {timestamp}')
-
-        figure.canvas.draw()
-        figure.canvas.flush_events()
+    # Read events on a separate thread, so that plotting does not delay the acquisition
+    acquisition_thread = threading.Thread(target=acquisition)
+    acquisition_thread.start()
+
+    # Plot the latest event, if any, until the end of the acquisition
+    canvas = figure.canvas
+    bbox = figure.bbox
+    refresh_period_s = 1 / 30  # Maximum refresh rate of 30 Hz, regardless of the trigger rate
+    next_refresh = time.monotonic()
+    while acquisition_thread.is_alive():
+        time.sleep(max(0., next_refresh - time.monotonic()))
+        if not new_event.wait(0.01):
+            canvas.flush_events()
+            continue
+        new_event.clear()
+        next_refresh = time.monotonic() + refresh_period_s
+
+        with buffers_lock:
+            # Get reference to data fields
+            data = buffers[0]
+            event_size = data[0].value
+            timestamp = data[1].value
+            waveform = data[2].value
+            waveform_size = data[3].value
+
+            # Plot first 4 channels
+            for i in range(n_ch):
+                valid_size = int(waveform_size[i])
+                lines[i].set_data(sample_range[:valid_size], waveform[i][:valid_size])
+
+            title.set_text(f'Timestamp: {timestamp}')
+
+        # Redraw only the artists that changed
+        canvas.restore_region(background)
+        draw_animated_artists()
+        canvas.blit(bbox)
+        canvas.flush_events()
+
+    acquisition_thread.join()
+    if acquisition_errors:
+        raise acquisition_errors[0]
 
     dig.cmd.DISARMACQUISITION()
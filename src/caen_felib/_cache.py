@@ -7,64 +7,120 @@ __copyright__ = 'Copyright (C) 2024 CAEN SpA'
 __license__ = 'LGPL-3.0-or-later'
 # SPDX-License-Identifier: LGPL-3.0-or-later
 
-from functools import _lru_cache_wrapper, lru_cache, wraps
-from typing import Optional
-from weakref import ReferenceType, ref
+from collections.abc import Callable
+from functools import lru_cache, wraps
+from types import MethodType
+from typing import Any, Optional
+from weakref import WeakValueDictionary
 
 
-class Manager(list[_lru_cache_wrapper]):
+class Storage(dict[str, Any]):
     """
-    A simple list of functions returned by `@lru_cache` decorator.
-
-    To be used with the optional parameter @p cache_manager of
-    lru_cache_method(), that will store a reference to the cached
-    function inside this list. This is a typing-safe way to call
-    `cache_clear` and `cache_info` of the internal cached functions,
-    even if not exposed directly by the inner function returned by
-    lru_cache_method().
+    Per-instance storage of the functions returned by `@lru_cache`
+    decorator, indexed by method name. Classes can store here also
+    other cached data, using keys that cannot clash with method names,
+    to have it cleared together with the cached methods.
+
+    Classes using cached() must provide an instance of this class on
+    their `_cache_storage` attribute. Being stored on the instance, the
+    cache is released together with the instance.
     """
+
+
+class Manager:
+    """
+    A simple registry of Storage instances.
+
+    To be used with the optional parameter @p cache_manager of cached(),
+    that will register here the storage of each instance the first time
+    a cached method is invoked. This is a typing-safe way to clear the
+    cache of all the instances, even if not exposed directly by the inner
+    function returned by cached(). Storages are referenced weakly, so
+    that the registry does not prevent their garbage collection.
+    """
+
+    def __init__(self) -> None:
+        self.__storages: WeakValueDictionary[int, Storage] = WeakValueDictionary()
+
+    def register(self, storage: Storage) -> None:
+        """Add a storage to the registry"""
+        self.__storages[id(storage)] = storage
+
     def clear_all(self) -> None:
-        """Invoke `cache_clear` on all functions in the list"""
-        for wrapper in self:
-            wrapper.cache_clear()
+        """Clear all the storages in the registry"""
+        for storage in list(self.__storages.values()):
+            storage.clear()
+
+
+class _CachedMethod:  # pylint: disable=too-few-public-methods
+    """
+    Descriptor returned by cached().
+
+    On attribute access it returns directly the `@lru_cache` decorated
+    bound method stored on the instance, so that calls do not pass
+    through a Python wrapper function. Accessed on the class, it can be
+    called as an unbound method, with the instance as first argument,
+    like `Node.get_path(node)`; these calls are not cached.
+    """
+
+    def __init__(self, method: Callable, cache_manager: Optional[Manager], maxsize: Optional[int], typed: bool) -> None:
+        self.__doc__ = method.__doc__
+        self.__method = method
+        self.__name = method.__name__
+        self.__cache_manager = cache_manager
+        self.__maxsize = maxsize
+        self.__typed = typed
+
+    def __call__(self, obj, *args, **kwargs):
+        return self.__method(obj, *args, **kwargs)
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        storage: Storage = obj._cache_storage  # pylint: disable=protected-access
+        try:
+            return storage[self.__name]
+        except KeyError:
+            return self.__make(obj, storage)
+
+    def __make(self, obj, storage: Storage) -> Callable:
+        # Optionally register storage to simplify cache
+        # management. See Manager documentation.
+        if self.__cache_manager is not None and not storage:
+            self.__cache_manager.register(storage)
+        cached_method = lru_cache(self.__maxsize, self.__typed)(MethodType(self.__method, obj))
+        storage[self.__name] = cached_method
+        return cached_method
 
 
 # Typing support for decorators comes with Python 3.10.
 # Omitted because very verbose.
 
 
-def cached(cache_manager: Optional[Manager] = None, maxsize: int = 128, typed: bool = False):
+def cached(cache_manager: Optional[Manager] = None, maxsize: Optional[int] = 128, typed: bool = False):
     """
-    LRU cache decorator that keeps a weak reference to self.
+    LRU cache decorator with per-instance storage.
 
     To be used as decorator on methods that are known to return always
     the same value. This can improve the performances of some methods by
     a factor > 1000.
-    This wrapper using weak references is required: functools.lru_cache
-    holds a reference to all arguments: using directly on the methods it
-    would hold a reference to self, introducing subdle memory leaks.
+    The `@lru_cache` decorated function is created the first time the
+    method is accessed on an instance, and is stored on the instance
+    itself: functools.lru_cache used directly on the methods would hold
+    a reference to self, introducing subdle memory leaks, while a weak
+    reference to self would be required on every call.
+    The decorated method is replaced by a descriptor that returns the
+    stored function, so that cache hits are resolved by the C
+    implementation of `@lru_cache` without additional Python frames.
+    As with `@lru_cache`, @p maxsize can be set to `None` to get an
+    unbounded cache without LRU bookkeeping, to be used on methods
+    with no arguments or with a limited set of them.
 
     @sa https://stackoverflow.com/a/68052994/3287591
     """
 
     def wrapper(method):
-
-        @lru_cache(maxsize, typed)
-        def cached_method(self_ref: ReferenceType, *args, **kwargs):
-            self = self_ref()
-            assert self is not None  # this function is always called by inner()
-            return method(self, *args, **kwargs)
-
-        @wraps(method)
-        def inner(self, *args, **kwargs):
-            return cached_method(ref(self), *args, **kwargs)
-
-        # Optionally store a reference to lru_cache decorated function to
-        # simplify cache management. See CacheManager documentation.
-        if cache_manager is not None:
-            cache_manager.append(cached_method)
-
-        return inner
+        return _CachedMethod(method, cache_manager, maxsize, typed)
 
     return wrapper
 
@@ -79,15 +135,10 @@ def clear(cache_manager: Manager):
 
     def wrapper(method):
 
-        def not_cached_method(self_ref: ReferenceType, *args, **kwargs):
-            self = self_ref()
-            assert self is not None  # this function is always called by inner()
-            return method(self, *args, **kwargs)
-
         @wraps(method)
         def inner(self, *args, **kwargs):
             cache_manager.clear_all()
-            return not_cached_method(ref(self), *args, **kwargs)
+            return method(self, *args, **kwargs)
 
         return inner
 
@@ -9,7 +9,24 @@ __license__ = 'LGPL-3.0-or-later'
 
 import ctypes as ct
 import sys
-from typing import Any, Optional, overload
+from functools import cache
+from typing import Any, Optional, Union, overload
+
+try:
+    from orjson import dumps as json_dumps, loads as json_loads  # type: ignore  # pylint: disable=unused-import
+except ImportError:
+    from json import dumps as _json_dumps, loads as json_loads  # type: ignore[assignment]
+
+    def json_dumps(obj: Any) -> bytes:  # type: ignore[misc]
+        """Same of orjson.dumps, returning bytes"""
+        return _json_dumps(obj).encode()
+
+# Comments on imports:
+# - orjson is an optional dependency, installed with the `fast` extra;
+#     json_loads is either orjson.loads or json.loads, both accepting
+#     bytes, so that results of the library can be parsed without decoding;
+#     json_dumps returns bytes, that can be passed to the library without
+#     encoding.
 
 
 class Lib:
@@ -83,25 +100,64 @@ class Lib:
         return self.path
 
 
+@cache
 def version_to_tuple(version: str) -> tuple[int, ...]:
-    """Version string in the form N.N.N to tuple (N, N, N)"""
+    """
+    Version string in the form N.N.N to tuple (N, N, N)
+
+    Cached because the same versions are compared on each version check.
+    """
     return tuple(map(int, version.split('.')))
 
 
-def to_bytes(path: str) -> bytes:
-    """Convert string to bytes"""
-    return path.encode()
+# Cache of to_bytes() and to_bytes_opt(). A plain dict is faster than
+# lru_cache on hits. None is always mapped to itself, so that
+# to_bytes_opt() needs a single lookup also on None; bytes are mapped to
+# themselves when first seen.
+_TO_BYTES_CACHE: dict[Union[str, bytes, None], Optional[bytes]] = {None: None}
+_TO_BYTES_CACHE_MAXSIZE = 4096
+
+
+def _to_bytes_cache_miss(path: Union[str, bytes]) -> bytes:
+    if len(_TO_BYTES_CACHE) >= _TO_BYTES_CACHE_MAXSIZE:
+        _TO_BYTES_CACHE.clear()
+        _TO_BYTES_CACHE[None] = None
+    b_path = path if isinstance(path, bytes) else path.encode()
+    _TO_BYTES_CACHE[path] = b_path
+    return b_path
+
+
+def to_bytes(path: Union[str, bytes]) -> bytes:
+    """
+    Convert string to bytes, bytes are returned as is
+
+    Cached because the same paths are converted again and again. The
+    cache is cleared when full, that is unlikely to happen since the
+    paths of a device are limited. UTF-8 is used, rather than ASCII,
+    because also parameter values are converted.
+    """
+    b_path = _TO_BYTES_CACHE.get(path)
+    if b_path is None:
+        b_path = _to_bytes_cache_miss(path)
+    return b_path
 
 
 @overload
 def to_bytes_opt(path: None) -> None: ...
 @overload
-def to_bytes_opt(path: str) -> bytes: ...
+def to_bytes_opt(path: Union[str, bytes]) -> bytes: ...
+
 
+def to_bytes_opt(path: Union[str, bytes, None]) -> Optional[bytes]:
+    """
+    Convert string to bytes, bytes and `None` are returned as is
 
-def to_bytes_opt(path: Optional[str]) -> Optional[bytes]:
-    """Convert string to bytes"""
-    return None if path is None else to_bytes(path)
+    Same cache of to_bytes(), inlined to save a function call.
+    """
+    b_path = _TO_BYTES_CACHE.get(path)
+    if b_path is None and path is not None:
+        b_path = _to_bytes_cache_miss(path)
+    return b_path
 
 
 # Slots brings some performance improvements and memory savings.
@@ -114,7 +170,7 @@ else:
     dataclass_slots = {}
 
 
-# Weakref support is required by the cache manager.
+# Weakref support is required by the finalizer of root nodes.
 if sys.version_info >= (3, 11):
     dataclass_slots_weakref = dataclass_slots | {'weakref_slot': True}
 else:
@@ -8,18 +8,20 @@ __license__ = 'LGPL-3.0-or-later'
 # SPDX-License-Identifier: LGPL-3.0-or-later
 
 import ctypes as ct
-from collections.abc import Iterator, Mapping, Sequence
-from dataclasses import dataclass, field
+import math
+import threading
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from dataclasses import InitVar, dataclass, field
 from enum import IntEnum, unique
 from functools import wraps
-from json import dumps, loads
 from typing import Any, ClassVar, Optional, Union
+from weakref import WeakValueDictionary, finalize
 
 import numpy as np
 import numpy.typing as npt
 from typing_extensions import Self
 
-from caen_felib import lib, _cache, _utils
+from caen_felib import error, lib, _cache, _utils
 
 # Comments on imports:
 # - Self moved to typing on Python 3.11
@@ -44,6 +46,55 @@ _DATA_TYPE_MAP: dict[str, npt.DTypeLike] = {
     'LONG DOUBLE':  ct.c_longdouble,
 }
 
+# NumPy data types, resolved once from the ctypes types
+_DATA_DTYPE_MAP: dict[str, np.dtype] = {k: np.dtype(v) for k, v in _DATA_TYPE_MAP.items()}
+
+
+# Return codes of CAEN_FELib_ReadData() returned by Node.try_read_data()
+# instead of raising an exception
+_READ_DATA_STATUS: dict[int, error.ErrorCode] = {
+    error.ErrorCode.SUCCESS:    error.ErrorCode.SUCCESS,
+    error.ErrorCode.TIMEOUT:    error.ErrorCode.TIMEOUT,
+    error.ErrorCode.STOP:       error.ErrorCode.STOP,
+}
+
+
+# Library functions used on hot paths, bound once to save an attribute
+# lookup on each call
+_lib_get_value = lib.get_value
+_lib_set_value = lib.set_value
+_lib_send_command = lib.send_command
+_lib_read_data = lib.read_data
+_lib_read_data_noexcept = lib.read_data_noexcept
+_lib_has_data = lib.has_data
+
+# Same for the utilities used on the same hot paths
+_to_bytes = _utils.to_bytes
+_to_bytes_opt = _utils.to_bytes_opt
+
+
+class _ThreadBuffers(threading.local):  # pylint: disable=too-few-public-methods
+    """
+    Buffers reused by the bindings of functions with output arguments,
+    allocated once per thread because the library can be called
+    concurrently by multiple threads.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.value = ct.create_string_buffer(256)
+        self.name = ct.create_string_buffer(32)
+        self.handle = ct.c_uint64()
+        self.node_type = ct.c_int()
+        self.register = ct.c_uint32()
+
+
+_thread_buffers = _ThreadBuffers()
+
+
+# Alignment of each field allocated by Node.set_read_data_format(), in bytes
+_DATA_ALIGNMENT = 64
+
 
 @dataclass(**_utils.dataclass_slots)
 class Data:
@@ -58,22 +109,26 @@ class Data:
     type: str  ## Field type
     dim: int = field(default=0, repr=False)  ## Field dimension
     shape: list[int] = field(default_factory=list, repr=False)  ## Field shape
+    buffer: InitVar[Optional[np.ndarray]] = None  ## Memory where to place value (allocated if `None`)
 
     # Private members
     __value: np.ndarray = field(init=False, repr=False)
     __proxy_value_2d: Optional[np.ndarray] = field(default=None, repr=False)
     __arg: Any = field(init=False, repr=False)
 
-    def __post_init__(self) -> None:
+    def __post_init__(self, buffer: Optional[np.ndarray]) -> None:
         if self.dim > 2:
             raise ValueError('dim cannot be larger than 2')
         if self.dim != len(self.shape):
             raise ValueError('shape length must match dim')
-        dtype = _DATA_TYPE_MAP.get(self.type)
+        dtype = _DATA_DTYPE_MAP.get(self.type)
         if dtype is None:
             raise ValueError('Invalid data type')
         # Memory allocation
-        self.__value = np.empty(self.shape, dtype=dtype)
+        if buffer is None:
+            self.__value = np.empty(self.shape, dtype=dtype)
+        else:
+            self.__value = np.ndarray(self.shape, dtype=dtype, buffer=buffer)
         self.__arg = self.__generate_arg()
 
     @property
@@ -97,18 +152,47 @@ class Data:
             # NumPy 2D arrays cannot be directly used because they are
             # implemented as contiguous memory blocks instead of arrays of
             # pointers, used by CAEN_FELib.
-            # To overcome the problem we generate a proxy ndarray of pointers.
-            ptr_gen = (v.ctypes.data for v in self.value)
-            self.__proxy_value_2d = np.fromiter(ptr_gen, dtype=ct.c_void_p)
+            # To overcome the problem we generate a proxy ndarray of pointers,
+            # computed from the address of the first row and the row stride.
+            n_rows = self.value.shape[0]
+            row_stride = self.value.strides[0]
+            self.__proxy_value_2d = np.arange(n_rows, dtype=np.uintp) * np.uintp(row_stride) + np.uintp(self.value.ctypes.data)
             value = self.__proxy_value_2d
-        # value.ctypes is equivalent to value.ctypes.data_as(ctypes.c_void_p),
-        # that is fine for us.
-        return value.ctypes
+        # A c_void_p instance is passed as is by ctypes, while value.ctypes
+        # would be converted on each call through its _as_parameter_
+        # property, that is much slower. Memory is kept alive by this
+        # instance, that holds value and the 2D proxy.
+        return ct.c_void_p(value.ctypes.data)
+
+    @property
+    def __array_interface__(self) -> dict[str, Any]:
+        """
+        NumPy array interface of Data.value, so that instances can be
+        passed directly to NumPy functions: `np.asarray(data)` returns a
+        view on the same memory, without copy.
+        """
+        return self.__value.__array_interface__
 
     def __str__(self) -> str:
         return self.name
 
 
+class _DataTuple(tuple[Data, ...]):
+    """
+    Tuple of Data returned by Node.set_read_data_format().
+
+    It also stores the arguments to be passed to ReadData, so that
+    Node.read_data() does not have to collect them on each call.
+    """
+
+    args: tuple[Any, ...]
+
+    def __new__(cls, data: Iterable[Data]) -> Self:
+        instance = super().__new__(cls, data)
+        instance.args = tuple(d.arg for d in instance)
+        return instance
+
+
 @unique
 class NodeType(IntEnum):
     """
@@ -142,17 +226,21 @@ class Node:
     root_node: Optional[Self]  ## Root node, set to None on root node (stored to prevent g.c.)
 
     # Private members
-    __opened: bool = field(init=False, repr=False)
+    __finalizer: Optional[finalize] = field(init=False, repr=False, default=None)
+    __properties: Optional[tuple[str, NodeType]] = field(init=False, repr=False, default=None)
+    __path: Optional[str] = field(init=False, repr=False, default=None)
+    __nodes: Optional[WeakValueDictionary[int, Self]] = field(init=False, repr=False, default=None)
+    _cache_storage: _cache.Storage = field(init=False, repr=False, default_factory=_cache.Storage)
 
     # Static private members
     __cache_manager: ClassVar[_cache.Manager] = _cache.Manager()
 
     def __post_init__(self) -> None:
-        self.__opened = self.root_node is None
-
-    def __del__(self) -> None:
-        if self.__opened:
-            self.close()
+        # Close root nodes when garbage collected, or at interpreter exit.
+        # A finalizer, unlike __del__, is not invoked on child nodes and
+        # runs while modules are still available.
+        if self.root_node is None:
+            self.__finalizer = finalize(self, lib.close, self.handle)
 
     # C API bindings
 
@@ -181,14 +269,16 @@ class Node:
         """
         Binding of CAEN_FELib_Close()
 
-        This will also clear class cache to remove all references to
-        child nodes. It will impact also nodes of other digitizer, but
-        is required to allow garbage collection of unused nodes.
+        This will also clear the cache of all nodes to remove all
+        references to child nodes. It will impact also nodes of other
+        digitizer, but allows garbage collection of unused nodes without
+        waiting for the cycle detector.
 
         @exception					error.Error in case of error
         """
         lib.close(self.handle)
-        self.__opened = False
+        if self.__finalizer is not None:
+            self.__finalizer.detach()
 
     def get_impl_lib_version(self) -> str:
         """
@@ -197,7 +287,7 @@ class Node:
         @return						version (a string)
         @exception					error.Error in case of error
         """
-        value = ct.create_string_buffer(16)
+        value = _thread_buffers.value
         lib.get_impl_lib_version(self.handle, value)
         return value.value.decode()
 
@@ -214,11 +304,12 @@ class Node:
         """
         b_path = _utils.to_bytes_opt(path)
         while True:
-            child_handles = np.empty([initial_size], dtype=ct.c_uint64)
-            child_handles_arg = child_handles.ctypes.data_as(ct.POINTER(ct.c_uint64))
-            res = lib.get_child_handles(self.handle, b_path, child_handles_arg, initial_size)
+            # A ctypes array is cheaper than a NumPy array to allocate,
+            # pass and convert to list, on the small sizes used here.
+            child_handles = (ct.c_uint64 * initial_size)()
+            res = lib.get_child_handles(self.handle, b_path, child_handles, initial_size)
             if res <= initial_size:
-                return tuple(self.__generate_child(handle.item()) for handle in child_handles[:res])
+                return tuple(map(self.__generate_child, child_handles[:res]))
             initial_size = res
 
     @_cache.cached(cache_manager=__cache_manager)
@@ -231,7 +322,7 @@ class Node:
         @return						parent node
         @exception					error.Error in case of error
         """
-        value = ct.c_uint64()
+        value = _thread_buffers.handle
         lib.get_parent_handle(self.handle, _utils.to_bytes_opt(path), value)
         return self.__generate_child(value.value)
 
@@ -244,11 +335,11 @@ class Node:
         @return						node at the provided path
         @exception					error.Error in case of error
         """
-        value = ct.c_uint64()
+        value = _thread_buffers.handle
         lib.get_handle(self.handle, _utils.to_bytes_opt(path), value)
         return self.__generate_child(value.value)
 
-    @_cache.cached(cache_manager=__cache_manager)
+    @_cache.cached(cache_manager=__cache_manager, maxsize=None)
     def get_path(self) -> str:
         """
         Binding of CAEN_FELib_GetPath()
@@ -257,11 +348,11 @@ class Node:
         @return						absolute path of the provided handle (a string)
         @exception					error.Error in case of error
         """
-        value = ct.create_string_buffer(256)
+        value = _thread_buffers.value
         lib.get_path(self.handle, value)
         return value.value.decode()
 
-    @_cache.cached(cache_manager=__cache_manager)
+    @_cache.cached(cache_manager=__cache_manager, maxsize=None)
     def get_node_properties(self, path: Optional[str] = None) -> tuple[str, NodeType]:
         """
         Binding of CAEN_FELib_GetNodeProperties()
@@ -271,8 +362,8 @@ class Node:
         @return						tuple containing node name (a string) and the node type (a NodeType)
         @exception					error.Error in case of error
         """
-        name = ct.create_string_buffer(32)
-        node_type = ct.c_int()
+        name = _thread_buffers.name
+        node_type = _thread_buffers.node_type
         lib.get_node_properties(self.handle, _utils.to_bytes_opt(path), name, node_type)
         return name.value.decode(), NodeType(node_type.value)
 
@@ -288,8 +379,8 @@ class Node:
             device_tree = ct.create_string_buffer(initial_size)
             res = lib.get_device_tree(self.handle, device_tree, initial_size)
             if res < initial_size:  # equal not fine, see docs
-                return loads(device_tree.value.decode())
-            initial_size = res
+                return _utils.json_loads(device_tree.value)
+            initial_size = res + 1  # res does not include the terminating null character
 
     def get_value(self, path: Optional[str] = None) -> str:
         """
@@ -300,8 +391,9 @@ class Node:
         @return						value of the node (a string)
         @exception					error.Error in case of error
         """
-        value = ct.create_string_buffer(256)
-        lib.get_value(self.handle, _utils.to_bytes_opt(path), value)
+        value = _thread_buffers.value
+        value[0] = b'\0'  # empty string: previous content would be passed as argument
+        _lib_get_value(self.handle, _to_bytes_opt(path), value)
         return value.value.decode()
 
     def get_value_with_arg(self, path: Optional[str], arg: str) -> str:
@@ -313,8 +405,9 @@ class Node:
         @return						value of the node (a string)
         @exception					error.Error in case of error
         """
-        value = ct.create_string_buffer(_utils.to_bytes(arg), 256)
-        lib.get_value(self.handle, _utils.to_bytes_opt(path), value)
+        value = _thread_buffers.value
+        value.value = _to_bytes(arg)
+        _lib_get_value(self.handle, _to_bytes_opt(path), value)
         return value.value.decode()
 
     def set_value(self, path: Optional[str], value: str) -> None:
@@ -326,7 +419,7 @@ class Node:
         @param[in] value			value to set (a string)
         @exception					error.Error in case of error
         """
-        lib.set_value(self.handle, _utils.to_bytes_opt(path), _utils.to_bytes(value))
+        _lib_set_value(self.handle, _to_bytes_opt(path), _to_bytes(value))
 
     def get_user_register(self, address: int) -> int:
         """
@@ -336,7 +429,7 @@ class Node:
         @return						value of the register (a int)
         @exception					error.Error in case of error
         """
-        value = ct.c_uint32()
+        value = _thread_buffers.register
         lib.get_user_register(self.handle, address, value)
         return value.value
 
@@ -358,7 +451,7 @@ class Node:
         @param[in] path				relative path of a node (either a string or `None` that is interpreted as an empty string)
         @exception					error.Error in case of error
         """
-        lib.send_command(self.handle, _utils.to_bytes_opt(path))
+        _lib_send_command(self.handle, _to_bytes_opt(path))
 
     def set_read_data_format(self, fmt: Sequence[Union[Mapping[str, Any]]]) -> tuple[Data, ...]:
         """
@@ -389,11 +482,12 @@ class Node:
         print(data[0])
         ```
 
+        @sa allocate_data()
         @param[in] fmt				JSON representation of the format, in compliance with the endpoint "format" property (a list of dictionaries)
         @return						Tuple of Data with allocated buffers of specified dim and shape, to be passed as second argument of read_data()
         @exception					error.Error in case of error
         """
-        lib.set_read_data_format(self.handle, dumps(fmt).encode())
+        lib.set_read_data_format(self.handle, _utils.json_dumps(fmt))
 
         # Important:
         # Do not update lib.ReadData.argtypes with data.argtype because lib.ReadData
@@ -403,7 +497,7 @@ class Node:
         # lib.ReadData.argtypes = [ct.c_uint64, ct.c_int] + [d.argtype for d in self.data]
 
         # Allocate requested fields
-        return tuple(Data(**f) for f in fmt)
+        return _allocate_data(fmt)
 
     def read_data(self, timeout: int, data: Sequence[Data]) -> None:
         """
@@ -439,10 +533,43 @@ class Node:
         ```
 
         @param[in] timeout			timeout of the function in milliseconds; if this value is -1 the function is blocking with infinite timeout
-        @param[out] data			The object returned by set_read_data_format().
+        @param[out] data			The object returned by set_read_data_format() (any other sequence of Data is accepted, but slower)
         @exception					error.Error in case of error
         """
-        lib.read_data(self.handle, timeout, *(d.arg for d in data))
+        args = data.args if isinstance(data, _DataTuple) else tuple(d.arg for d in data)
+        _lib_read_data(self.handle, timeout, *args)
+
+    def try_read_data(self, timeout: int, data: Sequence[Data]) -> error.ErrorCode:
+        """
+        Same of read_data(), but returns error.ErrorCode.TIMEOUT and
+        error.ErrorCode.STOP instead of raising an exception.
+
+        Preferred in acquisition loops, where timeouts are frequent and
+        raising an exception on each of them is expensive.
+
+        Example:
+        ```
+        while True:
+            status = ep_node.try_read_data(100, data)
+            if status is error.ErrorCode.TIMEOUT:
+                continue
+            if status is error.ErrorCode.STOP:
+                break
+
+            # Do stuff with data
+        ```
+
+        @param[in] timeout			timeout of the function in milliseconds; if this value is -1 the function is blocking with infinite timeout
+        @param[out] data			The object returned by set_read_data_format() (any other sequence of Data is accepted, but slower)
+        @return						error.ErrorCode.SUCCESS, error.ErrorCode.TIMEOUT or error.ErrorCode.STOP
+        @exception					error.Error in case of other errors
+        """
+        args = data.args if isinstance(data, _DataTuple) else tuple(d.arg for d in data)
+        res = _lib_read_data_noexcept(self.handle, timeout, *args)
+        status = _READ_DATA_STATUS.get(res)
+        if status is None:
+            raise error.Error(lib.last_error, res, 'CAEN_FELib_ReadData')
+        return status
 
     def has_data(self, timeout: int) -> None:
         """
@@ -451,30 +578,51 @@ class Node:
         @param[in] timeout			timeout of the function in milliseconds; if this value is -1 the function is blocking with infinite timeout
         @exception					error.Error in case of error
         """
-        lib.has_data(self.handle, timeout)
+        _lib_has_data(self.handle, timeout)
 
     # Private utilities
 
     def __generate_child(self, handle: int) -> Self:
         root_node = self if self.root_node is None else self.root_node
-        return type(self)(handle, root_node)
+        # Nodes are registered by handle on the root node, created on first
+        # use, to return the same instance for the same node from any path.
+        # References are weak, so the registry does not keep nodes alive.
+        # Nodes that used a cached method are part of a reference cycle,
+        # through the bound methods on their cache storage, and are
+        # released, and removed from the registry, by the garbage collector.
+        nodes = root_node.__nodes  # pylint: disable=protected-access
+        if nodes is None:
+            nodes = root_node.__nodes = WeakValueDictionary({root_node.handle: root_node})  # pylint: disable=protected-access,unused-private-member
+        node = nodes.get(handle)
+        if node is None:
+            node = nodes[handle] = type(self)(handle, root_node)
+        return node
 
     # Python utilities
 
     @property
     def name(self) -> str:
         """Node name"""
-        return self.get_node_properties(None)[0]
+        properties = self.__properties
+        if properties is None:
+            properties = self.__properties = self.get_node_properties(None)
+        return properties[0]
 
     @property
     def type(self) -> NodeType:
         """Node type"""
-        return self.get_node_properties(None)[1]
+        properties = self.__properties
+        if properties is None:
+            properties = self.__properties = self.get_node_properties(None)
+        return properties[1]
 
     @property
     def path(self) -> str:
         """Node absolute path"""
-        return self.get_path()
+        path = self.__path
+        if path is None:
+            path = self.__path = self.get_path()
+        return path
 
     @property
     def parent_node(self) -> Self:
@@ -512,12 +660,25 @@ class Node:
         yield from self.child_nodes
 
     def __getitem__(self, index: Any) -> Self:
-        return self.get_node(f'/{index}')
+        return self.__get_child_node(f'/{index}')
 
     def __getattr__(self, name: str) -> Self:
-        if name.startswith('__') and name.endswith('__'):
+        # Private and special names are never node names: reject them to
+        # prevent library calls on internal lookups, like on copy or pickle.
+        if name.startswith('_'):
             raise AttributeError(name)
-        return self.__getitem__(name)
+        return self.__get_child_node('/' + name)
+
+    def __get_child_node(self, path: str) -> Self:
+        # Child nodes are stored also on the cache storage, with the path
+        # as key that cannot clash with method names, to skip get_node().
+        # Shared by attribute and item access: `node.par` and `node['par']`
+        # resolve to the same entry.
+        storage = self._cache_storage
+        node = storage.get(path)
+        if node is None:
+            node = storage[path] = self.get_node(path)
+        return node
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Node):
@@ -535,6 +696,49 @@ class Node:
         return self.path
 
 
+def allocate_data(fmt: Sequence[Mapping[str, Any]]) -> tuple[Data, ...]:
+    """
+    Allocate data for a format, without setting it on any endpoint.
+
+    To be used to get additional buffers for a format already set with
+    Node.set_read_data_format(), like a pool of buffers to be filled by
+    an acquisition thread while others are being processed, without
+    copying data and without sending the format to the library again.
+
+    Example:
+    ```
+    ring = [ep_node.set_read_data_format(format)]
+    ring += [device.allocate_data(format) for _ in range(7)]
+    for i in itertools.count():
+        data = ring[i % len(ring)]
+        ep_node.read_data(-1, data)
+        # Pass data to a consumer, that must release it before it is
+        # used again
+    ```
+
+    @param[in] fmt				same argument of Node.set_read_data_format()
+    @return						same type returned by Node.set_read_data_format()
+    """
+    return _allocate_data(fmt)
+
+
+def _allocate_data(fmt: Sequence[Mapping[str, Any]]) -> _DataTuple:
+    # Fields are placed on a single memory block, each one aligned to
+    # _DATA_ALIGNMENT: this requires a single allocation, instead of one
+    # per field, and improves locality when fields are filled by ReadData.
+    offsets = []
+    size = 0
+    for f in fmt:
+        offsets.append(size)
+        dtype = _DATA_DTYPE_MAP.get(f['type'])
+        if dtype is not None:  # invalid types are reported by Data
+            nbytes = dtype.itemsize * math.prod(f.get('shape', ()))
+            size += -nbytes % _DATA_ALIGNMENT + nbytes
+    block = np.empty(size + _DATA_ALIGNMENT, dtype=np.uint8)
+    start = -block.ctypes.data % _DATA_ALIGNMENT
+    return _DataTuple(Data(**f, buffer=block[start + offset:]) for f, offset in zip(fmt, offsets))
+
+
 @wraps(Node.open)
 def connect(url: str) -> Node:
     """Binding of Node.open"""
@@ -0,0 +1,285 @@
+"""
+@ingroup Python
+
+Utilities to process waveforms returned by Node.read_data().
+
+@pre Functions are compiled with Numba, if installed (it can be installed
+with `pip install caen-felib[fast]`); otherwise, an equivalent NumPy
+implementation is used.
+"""
+
+__author__ = 'Giovanni Cerretani'
+__copyright__ = 'Copyright (C) 2024 CAEN SpA'
+__license__ = 'LGPL-3.0-or-later'
+# SPDX-License-Identifier: LGPL-3.0-or-later
+
+from collections.abc import Callable
+
+import numpy as np
+
+try:
+    from numba import njit, prange  # type: ignore
+    _HAS_NUMBA = True
+except ImportError:
+    # Loop variants are not used without Numba, but must still be valid
+    prange = range  # type: ignore[misc]  # pylint: disable=invalid-name
+    _HAS_NUMBA = False
+
+
+def _is_integer(value) -> bool:
+    return isinstance(value, (int, np.integer))
+
+
+def _scale_offset_numpy(src: np.ndarray, scale, offset, out: np.ndarray) -> np.ndarray:
+    if np.issubdtype(out.dtype, np.integer) and _is_integer(scale) and _is_integer(offset):
+        # Exact in the type of out, in modular arithmetic also on negative
+        # scale or offset: computed in place, without temporaries
+        np.multiply(src, np.asarray(scale).astype(out.dtype), out=out, dtype=out.dtype, casting='unsafe')
+        np.add(out, np.asarray(offset).astype(out.dtype), out=out)
+    else:
+        # Computed in float64 and cast to out once, as done by the loop variant:
+        # casting scale or offset to the type of out would truncate them.
+        np.add(np.multiply(src, scale, dtype=np.float64), offset, out=out, casting='unsafe')
+    return out
+
+
+def _subtract_baseline_numpy(src: np.ndarray, n_samples: int, out: np.ndarray) -> np.ndarray:
+    np.subtract(src, src[:n_samples].mean(), out=out, casting='unsafe')
+    return out
+
+
+def _subtract_baseline_2d_numpy(src: np.ndarray, n_samples: int, out: np.ndarray) -> np.ndarray:
+    np.subtract(src, src[:, :n_samples].mean(axis=1, keepdims=True), out=out, casting='unsafe')
+    return out
+
+
+def _integrate_numpy(src: np.ndarray, start: int, stop: int) -> float:
+    return float(src[start:stop].sum(dtype=np.float64))
+
+
+def _find_crossing_numpy(src: np.ndarray, threshold) -> int:
+    above = src >= threshold
+    # Index of the first sample above threshold, preceded by one below
+    crossings = np.flatnonzero(above[1:] & ~above[:-1])
+    return int(crossings[0]) + 1 if crossings.size else -1
+
+
+def _trapezoidal_filter_numpy(src: np.ndarray, rise_time: int, flat_top: int, out: np.ndarray) -> np.ndarray:
+    cumsum = np.cumsum(src, dtype=np.float64)
+    trapezoid = cumsum.copy()
+    for delay, sign in ((rise_time, -1), (rise_time + flat_top, -1), (2 * rise_time + flat_top, 1)):
+        trapezoid[delay:] += sign * cumsum[:cumsum.size - delay]
+    np.divide(trapezoid, rise_time, out=out, casting='unsafe')
+    return out
+
+
+def _scale_offset_loop(src, scale, offset, out):
+    for i in range(src.shape[0]):
+        out[i] = float(src[i]) * scale + offset
+    return out
+
+
+def _subtract_baseline_loop(src, n_samples, out):
+    baseline = 0.
+    for i in range(n_samples):
+        baseline += src[i]
+    baseline /= n_samples
+    for i in range(src.shape[0]):
+        out[i] = src[i] - baseline
+    return out
+
+
+def _subtract_baseline_2d_loop(src, n_samples, out):
+    # Rows are independent: run in parallel when compiled by Numba
+    for row in prange(src.shape[0]):  # pylint: disable=not-an-iterable
+        baseline = 0.
+        for i in range(n_samples):
+            baseline += src[row, i]
+        baseline /= n_samples
+        for i in range(src.shape[1]):
+            out[row, i] = src[row, i] - baseline
+    return out
+
+
+def _integrate_loop(src, start, stop):
+    acc = 0.
+    for i in range(start, min(stop, src.shape[0])):
+        acc += src[i]
+    return acc
+
+
+def _find_crossing_loop(src, threshold):
+    for i in range(1, src.shape[0]):
+        if src[i - 1] < threshold <= src[i]:
+            return i
+    return -1
+
+
+def _trapezoidal_filter_loop(src, rise_time, flat_top, out):
+    # Running sum of the last rise_time samples, minus the running sum
+    # of the rise_time samples before the flat top
+    delay_1 = rise_time
+    delay_2 = rise_time + flat_top
+    delay_3 = 2 * rise_time + flat_top
+    acc = 0.
+    for i in range(src.shape[0]):
+        acc += src[i]
+        if i >= delay_1:
+            acc -= src[i - delay_1]
+        if i >= delay_2:
+            acc -= src[i - delay_2]
+        if i >= delay_3:
+            acc += src[i - delay_3]
+        out[i] = acc / rise_time
+    return out
+
+
+_scale_offset: Callable[..., np.ndarray]
+_subtract_baseline: Callable[..., np.ndarray]
+_subtract_baseline_2d: Callable[..., np.ndarray]
+_integrate: Callable[..., float]
+_find_crossing: Callable[..., int]
+_trapezoidal_filter: Callable[..., np.ndarray]
+
+if _HAS_NUMBA:
+    # nogil allows other threads, like an acquisition thread, to run
+    # while processing the waveforms.
+    _scale_offset = njit(cache=True, nogil=True)(_scale_offset_loop)
+    _subtract_baseline = njit(cache=True, nogil=True)(_subtract_baseline_loop)
+    _subtract_baseline_2d = njit(cache=True, nogil=True, parallel=True)(_subtract_baseline_2d_loop)
+    _integrate = njit(cache=True, nogil=True)(_integrate_loop)
+    _find_crossing = njit(cache=True, nogil=True)(_find_crossing_loop)
+    _trapezoidal_filter = njit(cache=True, nogil=True)(_trapezoidal_filter_loop)
+else:
+    _scale_offset = _scale_offset_numpy
+    _subtract_baseline = _subtract_baseline_numpy
+    _subtract_baseline_2d = _subtract_baseline_2d_numpy
+    _integrate = _integrate_numpy
+    _find_crossing = _find_crossing_numpy
+    _trapezoidal_filter = _trapezoidal_filter_numpy
+
+
+# Arguments are validated by the public functions, so that the result does
+# not depend on the variant in use: out of range values would give NaN or
+# infinity on NumPy variants, errors or out of bounds accesses on loops.
+
+
+def _check_out(src: np.ndarray, out: np.ndarray, ndim: int) -> None:
+    if src.ndim != ndim:
+        raise ValueError(f'src must be a {ndim}D array')
+    if out.shape != src.shape:
+        raise ValueError('out must have the same shape of src')
+
+
+def _check_n_samples(src: np.ndarray, n_samples: int) -> None:
+    if not 0 < n_samples <= src.shape[-1]:
+        raise ValueError('n_samples must be in [1, number of samples]')
+
+
+def scale_offset(src: np.ndarray, scale, offset, out: np.ndarray) -> np.ndarray:
+    """
+    Compute `src * scale + offset`.
+
+    If Numba is not installed, the NumPy implementation computes it in
+    place, without temporary arrays, when @p out is of integer type and
+    @p scale and @p offset are integers; otherwise, it is computed in
+    float64 on a temporary array, then cast to @p out.
+
+    Example:
+    ```
+    digital_probe_scaled = np.empty(reclen, dtype=np.uint16)
+    dsp.scale_offset(digital_probe, 2000, 1000, digital_probe_scaled)
+    ```
+
+    @param[in] src				1D input array
+    @param[in] scale			scale factor
+    @param[in] offset			offset added after scaling
+    @param[out] out				1D output array, with the same size of @p src
+    @return						@p out
+    @exception					ValueError if @p src is not 1D or @p out has a different shape
+    """
+    _check_out(src, out, 1)
+    return _scale_offset(src, scale, offset, out)
+
+
+def subtract_baseline(src: np.ndarray, n_samples: int, out: np.ndarray) -> np.ndarray:
+    """
+    Subtract baseline, computed as the mean of the first samples.
+
+    @param[in] src				1D input array
+    @param[in] n_samples		number of samples used to compute the baseline
+    @param[out] out				1D output array, with the same size of @p src (usually of floating point type)
+    @return						@p out
+    @exception					ValueError if @p src is not 1D, @p out has a different shape or @p n_samples is not in [1, size of @p src]
+    """
+    _check_out(src, out, 1)
+    _check_n_samples(src, n_samples)
+    return _subtract_baseline(src, n_samples, out)
+
+
+def subtract_baseline_2d(src: np.ndarray, n_samples: int, out: np.ndarray) -> np.ndarray:
+    """
+    Same of subtract_baseline(), on each row of a 2D array, like the
+    waveforms of all channels returned by the `scope` endpoint. Rows are
+    processed in parallel, if compiled with Numba.
+
+    @param[in] src				2D input array
+    @param[in] n_samples		number of samples of each row used to compute its baseline
+    @param[out] out				2D output array, with the same shape of @p src (usually of floating point type)
+    @return						@p out
+    @exception					ValueError if @p src is not 2D, @p out has a different shape or @p n_samples is not in [1, size of the rows of @p src]
+    """
+    _check_out(src, out, 2)
+    _check_n_samples(src, n_samples)
+    return _subtract_baseline_2d(src, n_samples, out)
+
+
+def integrate(src: np.ndarray, start: int, stop: int) -> float:
+    """
+    Sum of the samples in the range [@p start, @p stop), like the charge
+    of a baseline subtracted pulse.
+
+    @param[in] src				1D input array
+    @param[in] start			first sample of the range
+    @param[in] stop				sample after the last of the range (truncated to the size of @p src)
+    @return						sum of the samples, as floating point
+    @exception					ValueError if @p start is negative or @p stop is smaller than @p start
+    """
+    if start < 0:
+        raise ValueError('start cannot be negative')
+    if stop < start:
+        raise ValueError('stop cannot be smaller than start')
+    return _integrate(src, start, stop)
+
+
+def find_crossing(src: np.ndarray, threshold) -> int:
+    """
+    Find the first rising crossing of a threshold.
+
+    @param[in] src				1D input array
+    @param[in] threshold		threshold value
+    @return						index of the first sample greater or equal than @p threshold, preceded by a sample below it; -1 if not found
+    """
+    return _find_crossing(src, threshold)
+
+
+def trapezoidal_filter(src: np.ndarray, rise_time: int, flat_top: int, out: np.ndarray) -> np.ndarray:
+    """
+    Trapezoidal filter, computed as the difference of two moving sums of
+    @p rise_time samples, spaced by @p flat_top samples, normalized to
+    @p rise_time. Samples before the beginning of @p src are assumed to
+    be zero, so @p src is expected to be baseline subtracted.
+
+    @param[in] src				1D input array
+    @param[in] rise_time		rise time of the trapezoid, in samples
+    @param[in] flat_top			flat top of the trapezoid, in samples
+    @param[out] out				1D output array, with the same size of @p src (usually of floating point type)
+    @return						@p out
+    @exception					ValueError if @p src is not 1D, @p out has a different shape, @p rise_time is not positive or @p flat_top is negative
+    """
+    _check_out(src, out, 1)
+    if rise_time <= 0:
+        raise ValueError('rise_time must be positive')
+    if flat_top < 0:
+        raise ValueError('flat_top cannot be negative')
+    return _trapezoidal_filter(src, rise_time, flat_top, out)
@@ -9,7 +9,6 @@ __license__ = 'LGPL-3.0-or-later'
 
 import ctypes as ct
 from collections.abc import Callable
-from json import loads
 from typing_extensions import TypeAlias
 
 from caen_felib import error, _utils
@@ -71,6 +70,9 @@ class _Lib(_utils.Lib):
         #     relying on ctypes automatic conversions with from_param methods. For more details, see
         #     https://stackoverflow.com/q/74630617/3287591
         self.read_data = self.__get('ReadData', ct.c_uint64, ct.c_int, variadic=True)
+        # Same of read_data, without errcheck: the return code is returned as is, so that
+        # frequent non-error return codes, like TIMEOUT, do not raise exceptions.
+        self.read_data_noexcept = self.__get('ReadData', ct.c_uint64, ct.c_int, variadic=True, errcheck=False)
 
     def __api_errcheck(self, res: int, func: Callable, _: tuple) -> int:
         # res can be positive on GetChildHandles and GetDeviceTree
@@ -88,10 +90,14 @@ class _Lib(_utils.Lib):
                     raise RuntimeError(f'{name} requires {self.name} >= {min_version}. Please update it.')
                 return fallback
         l_lib = self.lib if not kwargs.get('variadic', False) else self.lib_variadic
-        func = getattr(l_lib, f'CAEN_FELib_{name}')
+        # Use item access instead of getattr, that returns a cached object, to
+        # get a new function object, not shared with other bindings of the
+        # same function that may have different attributes.
+        func = l_lib[f'CAEN_FELib_{name}']
         func.argtypes = args
         func.restype = ct.c_int
-        func.errcheck = self.__api_errcheck
+        if kwargs.get('errcheck', True):
+            func.errcheck = self.__api_errcheck
         return func
 
     def __ver_at_least(self, target: tuple[int, ...]) -> bool:
@@ -112,8 +118,8 @@ class _Lib(_utils.Lib):
             lib_info = ct.create_string_buffer(initial_size)
             res = self.__get_lib_info(lib_info, initial_size)
             if res < initial_size:  # equal not fine, see docs
-                return loads(lib_info.value.decode())
-            initial_size = res
+                return _utils.json_loads(lib_info.value)
+            initial_size = res + 1  # res does not include the terminating null character
 
     def get_lib_version(self) -> str:
         """
@@ -0,0 +1,113 @@
+"""
+@ingroup Python
+
+Data formats, to be passed to Node.set_read_data_format(), of the
+decoded endpoints used by the demos.
+"""
+
+__author__ = 'Giovanni Cerretani'
+__copyright__ = 'Copyright (C) 2024 CAEN SpA'
+__license__ = 'LGPL-3.0-or-later'
+# SPDX-License-Identifier: LGPL-3.0-or-later
+
+from typing import Any
+
+from typing_extensions import TypeAlias
+
+# Comments on imports:
+# - TypeAlias moved to typing on Python 3.10
+
+DataFormat: TypeAlias = tuple[dict[str, Any], ...]
+
+
+def scope_data_format(n_ch: int, reclen: int) -> DataFormat:
+    """
+    Data format of the `scope` endpoint, with waveforms of all channels.
+
+    Fields are `EVENT_SIZE`, `TIMESTAMP`, `WAVEFORM` (2D) and
+    `WAVEFORM_SIZE` (1D).
+
+    @param[in] n_ch				number of channels
+    @param[in] reclen			record length, in samples
+    @return						data format (a tuple of dictionaries)
+    """
+    return (
+        {
+            'name': 'EVENT_SIZE',
+            'type': 'SIZE_T',
+        },
+        {
+            'name': 'TIMESTAMP',
+            'type': 'U64',
+        },
+        {
+            'name': 'WAVEFORM',
+            'type': 'U16',
+            'dim': 2,
+            'shape': [n_ch, reclen],
+        },
+        {
+            'name': 'WAVEFORM_SIZE',
+            'type': 'U64',
+            'dim': 1,
+            'shape': [n_ch],
+        },
+    )
+
+
+def dpp_data_format(reclen: int) -> DataFormat:
+    """
+    Data format of the DPP decoded endpoints (like `dpppha` or `dpppsd`),
+    with an analog and a digital probe.
+
+    Fields are `CHANNEL`, `TIMESTAMP`, `ENERGY`, `ANALOG_PROBE_1` (1D),
+    `ANALOG_PROBE_1_TYPE`, `DIGITAL_PROBE_1` (1D), `DIGITAL_PROBE_1_TYPE`
+    and `WAVEFORM_SIZE`.
+
+    @param[in] reclen			record length, in samples
+    @return						data format (a tuple of dictionaries)
+    """
+    return (
+        {
+            'name': 'CHANNEL',
+            'type': 'U8',
+            'dim': 0,
+        },
+        {
+            'name': 'TIMESTAMP',
+            'type': 'U64',
+            'dim': 0,
+        },
+        {
+            'name': 'ENERGY',
+            'type': 'U16',
+            'dim': 0,
+        },
+        {
+            'name': 'ANALOG_PROBE_1',
+            'type': 'I16',
+            'dim': 1,
+            'shape': [reclen],
+        },
+        {
+            'name': 'ANALOG_PROBE_1_TYPE',
+            'type': 'I32',
+            'dim': 0,
+        },
+        {
+            'name': 'DIGITAL_PROBE_1',
+            'type': 'U8',
+            'dim': 1,
+            'shape': [reclen],
+        },
+        {
+            'name': 'DIGITAL_PROBE_1_TYPE',
+            'type': 'I32',
+            'dim': 0,
+        },
+        {
+            'name': 'WAVEFORM_SIZE',
+            'type': 'SIZE_T',
+            'dim': 0,
+        },
+    )
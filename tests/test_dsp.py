@@ -0,0 +1,170 @@
+"""
+Tests of the dsp module: NumPy, loop and compiled variants of each kernel must agree.
+"""
+
+__author__ = 'Giovanni Cerretani'
+__copyright__ = 'Copyright (C) 2024 CAEN SpA'
+__license__ = 'LGPL-3.0-or-later'
+# SPDX-License-Identifier: LGPL-3.0-or-later
+
+import importlib
+import sys
+import unittest
+from pathlib import Path
+from types import ModuleType
+
+import numpy as np
+
+
+def _load_dsp():
+    # The package __init__ loads the CAEN FELib shared library, not required
+    # by dsp: if not available, dsp is loaded from a stub package. The module
+    # name must be caen_felib.dsp anyway, as the Numba cache is shared with
+    # the installed module, being keyed on the path of the source file.
+    try:
+        return importlib.import_module('caen_felib.dsp')
+    except (ImportError, OSError, RuntimeError):
+        pass
+    for name in [n for n in sys.modules if n == 'caen_felib' or n.startswith('caen_felib.')]:
+        del sys.modules[name]
+    package = ModuleType('caen_felib')
+    package.__path__ = [str(Path(__file__).parents[1] / 'src' / 'caen_felib')]
+    sys.modules['caen_felib'] = package
+    return importlib.import_module('caen_felib.dsp')
+
+
+dsp = _load_dsp()
+
+
+def _variants(name):
+    """NumPy and loop variants of a kernel, and the compiled one if Numba is installed"""
+    variants = [getattr(dsp, f'_{name}_numpy'), getattr(dsp, f'_{name}_loop')]
+    if dsp._HAS_NUMBA:
+        variants.append(getattr(dsp, f'_{name}'))
+    return variants
+
+
+class TestScaleOffset(unittest.TestCase):
+    """Variants of scale_offset()"""
+
+    def check(self, src, scale, offset, out_dtype):
+        """Run all the variants and compare their results"""
+        out_numpy, *outs = (f(src, scale, offset, np.empty(src.shape, dtype=out_dtype)) for f in _variants('scale_offset'))
+        for out in outs:
+            np.testing.assert_array_equal(out_numpy, out)
+        return out_numpy
+
+    def test_integer_src_float_scale(self):
+        src = np.array([10, 20, 30], dtype=np.uint16)
+        out = self.check(src, 0.5, 0, np.int32)
+        np.testing.assert_array_equal(out, [5, 10, 15])
+
+    def test_integer_out_float_offset(self):
+        src = np.array([10, 20, 30], dtype=np.uint16)
+        out = self.check(src, 2, 0.5, np.int32)
+        np.testing.assert_array_equal(out, [20, 40, 60])
+
+    def test_result_larger_than_src_type(self):
+        src = np.array([0, 1, 20], dtype=np.uint8)
+        out = self.check(src, 2000, 1000, np.uint16)
+        np.testing.assert_array_equal(out, [1000, 3000, 41000])
+
+    def test_integer_negative_offset(self):
+        src = np.array([10, 20, 30], dtype=np.uint16)
+        out = self.check(src, 3, -5, np.int32)
+        np.testing.assert_array_equal(out, [25, 55, 85])
+
+    def test_unsigned_out_negative_scale_offset(self):
+        src = np.array([10, 20, 30], dtype=np.uint16)
+        out = self.check(src, 3, -5, np.uint16)
+        np.testing.assert_array_equal(out, [25, 55, 85])
+        out = self.check(src, -1, 100, np.uint16)
+        np.testing.assert_array_equal(out, [90, 80, 70])
+
+    def test_float(self):
+        src = np.array([-1.5, 0., 2.25], dtype=np.float32)
+        self.check(src, 1.5, -0.25, np.float64)
+
+
+class TestFilters(unittest.TestCase):
+    """Variants of subtract_baseline() and trapezoidal_filter()"""
+
+    src = np.array([10, 12, 11, 50, 80, 60, 40, 20, 11, 10], dtype=np.uint16)
+
+    def test_subtract_baseline(self):
+        out_numpy, *outs = (f(self.src, 3, np.empty(self.src.shape)) for f in _variants('subtract_baseline'))
+        for out in outs:
+            np.testing.assert_allclose(out_numpy, out)
+
+    def test_trapezoidal_filter(self):
+        src = self.src - 11.
+        out_numpy, *outs = (f(src, 2, 1, np.empty(src.shape)) for f in _variants('trapezoidal_filter'))
+        for out in outs:
+            np.testing.assert_allclose(out_numpy, out)
+
+    def test_invalid_arguments(self):
+        out = np.empty(self.src.shape)
+        short_out = np.empty(self.src.size - 1)
+        with self.assertRaises(ValueError):
+            dsp.scale_offset(self.src, 2, 0, short_out)
+        with self.assertRaises(ValueError):
+            dsp.subtract_baseline(self.src, 3, short_out)
+        with self.assertRaises(ValueError):
+            dsp.trapezoidal_filter(self.src, 2, 1, short_out)
+        with self.assertRaises(ValueError):
+            dsp.scale_offset(self.src.reshape(2, -1), 2, 0, out.reshape(2, -1))
+        for n_samples in (0, -1, self.src.size + 1):
+            with self.assertRaises(ValueError):
+                dsp.subtract_baseline(self.src, n_samples, out)
+        with self.assertRaises(ValueError):
+            dsp.trapezoidal_filter(self.src, 0, 1, out)
+        with self.assertRaises(ValueError):
+            dsp.trapezoidal_filter(self.src, 2, -1, out)
+
+
+class TestMultichannel(unittest.TestCase):
+    """Variants of subtract_baseline_2d(), integrate() and find_crossing()"""
+
+    src = np.array([[1, 1, 5, 9, 3], [2, 2, 2, 8, 2]], dtype=np.uint16)
+
+    def test_subtract_baseline_2d(self):
+        out_numpy, *outs = (f(self.src, 2, np.empty(self.src.shape)) for f in _variants('subtract_baseline_2d'))
+        for out in outs:
+            np.testing.assert_allclose(out_numpy, out)
+
+    def test_integrate(self):
+        for start, stop in ((0, 5), (1, 4), (2, 2), (3, 10)):
+            result_numpy, *results = (f(self.src[0], start, stop) for f in _variants('integrate'))
+            for result in results:
+                self.assertEqual(result_numpy, result)
+
+    def check_crossing(self, src, threshold, expected):
+        """Run all the variants of find_crossing() and compare with the expected index"""
+        for f in _variants('find_crossing'):
+            self.assertEqual(f(src, threshold), expected)
+
+    def test_find_crossing(self):
+        src = self.src[0]
+        self.check_crossing(src, 20, -1)  # no crossing
+        self.check_crossing(src, 3, 2)
+        self.check_crossing(np.array([0, 5, 6, 1], dtype=np.uint16), 4, 1)  # crossing at index 1
+        self.check_crossing(np.array([9, 8, 2, 1], dtype=np.uint16), 5, -1)  # starts above, never crosses
+        self.check_crossing(np.array([9, 2, 8, 1], dtype=np.uint16), 5, 2)  # starts above, crosses later
+
+    def test_invalid_arguments(self):
+        out = np.empty(self.src.shape)
+        for n_samples in (0, self.src.shape[1] + 1):
+            with self.assertRaises(ValueError):
+                dsp.subtract_baseline_2d(self.src, n_samples, out)
+        with self.assertRaises(ValueError):
+            dsp.subtract_baseline_2d(self.src, 2, out[:, :-1])
+        with self.assertRaises(ValueError):
+            dsp.subtract_baseline_2d(self.src[0], 2, out[0])
+        with self.assertRaises(ValueError):
+            dsp.integrate(self.src[0], -1, 3)
+        with self.assertRaises(ValueError):
+            dsp.integrate(self.src[0], 3, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()